@@ -0,0 +1,794 @@
+"""NLRB data command-line interface.
+
+This module provides the `nlrb-data` console script, which wraps the scraper methods in `list`, `fetch`, `sync`
+and `export` subcommands.  Searches are split into shards by date window, case type, status and company, and
+shards are distributed across local processes, each of which runs a pool of worker threads behind a shared
+request rate limit.
+"""
+
+# Standard imports
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+# third-party package imports
+import dateutil.parser
+import pandas
+import requests
+
+# Project imports
+from nlrb_data import scraper
+from nlrb_data import __version__
+
+# Constants
+DEFAULT_SHARD_DAYS = 7
+DEFAULT_PROCESSES = 1
+DEFAULT_WORKERS = 1
+DEFAULT_RATE = 1.0
+PROGRESS_INTERVAL = 5
+CASE_TABLES = ("cases", "docket", "participants", "allegations", "elections")
+
+
+class RateLimiter(object):
+    """
+    Thread-safe limiter that spaces calls to at most `rate` per second.
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: maximum calls per second; zero or None disables limiting
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the next call slot is available.
+        :return:
+        """
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RateLimitedSession(requests.Session):
+    """
+    Session that waits on a shared rate limiter before each request and counts requests made.
+    """
+
+    def __init__(self, limiter):
+        """
+        :param limiter: RateLimiter shared by all sessions in the process
+        """
+        super(RateLimitedSession, self).__init__()
+        self.limiter = limiter
+        self.request_count = 0
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.wait()
+        self.request_count += 1
+        return super(RateLimitedSession, self).request(method, url, *args, **kwargs)
+
+
+def parse_date(value):
+    """
+    Parse a command-line date argument.
+    :param value:
+    :return:
+    """
+    try:
+        return dateutil.parser.parse(value).date()
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError("invalid date: {0}".format(value))
+
+
+def get_date_shards(start_date, end_date, shard_days=DEFAULT_SHARD_DAYS):
+    """
+    Split an inclusive date range into consecutive, non-overlapping inclusive windows.
+    :param start_date:
+    :param end_date:
+    :param shard_days:
+    :return:
+    """
+    if shard_days < 1:
+        raise ValueError("shard_days must be positive")
+
+    shards = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + datetime.timedelta(days=shard_days - 1), end_date)
+        shards.append((window_start, window_end))
+        window_start = window_end + datetime.timedelta(days=1)
+
+    return shards
+
+
+def get_search_shards(start_date, end_date, statuses=None, case_types=None, companies=None,
+                      shard_days=DEFAULT_SHARD_DAYS):
+    """
+    Build the list of search shards for a date range and filters; each shard is a dict of
+    `get_case_list` keyword arguments.
+    :param start_date:
+    :param end_date:
+    :param statuses:
+    :param case_types:
+    :param companies:
+    :param shard_days:
+    :return:
+    """
+    shards = []
+    for dates in get_date_shards(start_date, end_date, shard_days):
+        for status in statuses or [None]:
+            for case_type in case_types or [None]:
+                for company in companies or [None]:
+                    shards.append({"dates": dates, "status": status, "case_type": case_type, "company": company})
+
+    return shards
+
+
+def dataframe_to_records(df):
+    """
+    Convert a dataframe to a list of dicts, replacing missing values with None.
+    :param df:
+    :return:
+    """
+    if df.shape[0] == 0:
+        return []
+
+    df = df.astype(object)
+    return df.where(pandas.notnull(df), None).to_dict(orient="records")
+
+
+def serialize_case(case_info):
+    """
+    Convert a `get_case` result into JSON-serializable structures.
+    :param case_info:
+    :return:
+    """
+    result = dict()
+    for key, value in case_info.items():
+        if isinstance(value, pandas.DataFrame):
+            result[key] = dataframe_to_records(value)
+        else:
+            result[key] = value
+
+    return result
+
+
+def json_default(value):
+    """
+    JSON encoder fallback for dates.
+    :param value:
+    :return:
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError("{0!r} is not JSON serializable".format(value))
+
+
+def to_json(value):
+    """
+    Encode a value as a single JSON line.
+    :param value:
+    :return:
+    """
+    return json.dumps(value, default=json_default, sort_keys=True)
+
+
+def list_shard(shard, session):
+    """
+    Task: retrieve the case list for one search shard.  The session's rate limiter replaces
+    the scraper's fixed sleep between requests.
+    :param shard:
+    :param session:
+    :return:
+    """
+    return scraper.get_case_list(session=session, sleep_interval=0, **shard)
+
+
+def fetch_case(case_number, session):
+    """
+    Task: retrieve and serialize one case.
+    :param case_number:
+    :param session:
+    :return:
+    """
+    return serialize_case(scraper.get_case(case_number, session=session))
+
+
+def run_items(task, items, workers, rate, result_queue, stop_event):
+    """
+    Run a task over items in a thread pool within the current process, putting
+    ("result", item, value, error) tuples on the result queue as they complete, followed
+    by a ("done", request_count) tuple.  Items not yet started when the stop event is set
+    are skipped.
+    :param task:
+    :param items:
+    :param workers:
+    :param rate:
+    :param result_queue:
+    :param stop_event:
+    :return:
+    """
+    limiter = RateLimiter(rate)
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def run_item(item):
+        if stop_event.is_set():
+            return
+
+        # requests sessions are not shared across threads
+        if not hasattr(local, "session"):
+            local.session = RateLimitedSession(limiter)
+            with sessions_lock:
+                sessions.append(local.session)
+
+        try:
+            result_queue.put(("result", item, task(item, local.session), None))
+        except Exception as e:
+            result_queue.put(("result", item, None, "{0}: {1}".format(type(e).__name__, e)))
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(run_item, items))
+    finally:
+        result_queue.put(("done", sum(session.request_count for session in sessions)))
+
+
+class Progress(object):
+    """
+    Track task completion and report live throughput on stderr.
+    """
+
+    def __init__(self, label, total, quiet=False, interval=PROGRESS_INTERVAL, stream=None):
+        self.label = label
+        self.total = total
+        self.quiet = quiet
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.start_time = time.monotonic()
+        self.last_report = self.start_time
+        self.succeeded = 0
+        self.failed = 0
+        self.records = 0
+        self.requests = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def update(self, error=None, records=0):
+        """
+        Record one completed task and report if the reporting interval has elapsed.
+        :param error:
+        :param records:
+        :return:
+        """
+        if error:
+            self.failed += 1
+        else:
+            self.succeeded += 1
+            self.records += records
+
+        self.tick()
+
+    def tick(self):
+        """
+        Report if the reporting interval has elapsed.
+        :return:
+        """
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        """
+        Write a progress line.
+        :return:
+        """
+        if self.quiet:
+            return
+
+        done = self.succeeded + self.failed
+        rate = done / self.elapsed if self.elapsed > 0 else 0.0
+        self.stream.write("{0}: {1}/{2} done, {3} failed, {4} records, {5:.2f}/s\n"
+                          .format(self.label, done, self.total, self.failed, self.records, rate))
+        self.stream.flush()
+
+    def stats(self):
+        """
+        Get summary statistics as a dict.
+        :return:
+        """
+        elapsed = self.elapsed
+        return {"total": self.total,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "incomplete": self.total - self.succeeded - self.failed,
+                "records": self.records,
+                "requests": self.requests,
+                "elapsed_seconds": round(elapsed, 3),
+                "items_per_second": round((self.succeeded + self.failed) / elapsed, 3) if elapsed > 0 else 0.0}
+
+
+def run_sharded(task, items, processes=DEFAULT_PROCESSES, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                progress=None):
+    """
+    Run a task over items, sharded round-robin across local processes, each with a pool of
+    worker threads.  The total request rate is divided evenly between processes.  Yields
+    (item, result, error) tuples as tasks complete, then returns the total request count.
+    An optional progress tracker keeps reporting while waiting on long-running tasks.
+    :param task:
+    :param items:
+    :param processes:
+    :param workers:
+    :param rate:
+    :param progress:
+    :return:
+    """
+    items = list(items)
+    processes = max(1, min(processes, len(items)))
+    process_rate = float(rate) / processes if rate else 0
+
+    if processes == 1:
+        result_queue = queue.Queue()
+        stop_event = threading.Event()
+        runner = threading.Thread(target=run_items,
+                                  args=(task, items, workers, process_rate, result_queue, stop_event))
+        runner.daemon = True
+        runner.start()
+        children = []
+    else:
+        result_queue = multiprocessing.Queue()
+        stop_event = multiprocessing.Event()
+        children = [multiprocessing.Process(target=run_items,
+                                            args=(task, items[i::processes], workers, process_rate, result_queue,
+                                                  stop_event))
+                    for i in range(processes)]
+        for child in children:
+            child.daemon = True
+            child.start()
+
+    request_count = 0
+    remaining = processes
+    try:
+        while remaining > 0:
+            try:
+                message = result_queue.get(timeout=1)
+            except queue.Empty:
+                if progress:
+                    progress.tick()
+
+                if children and not any(child.is_alive() for child in children):
+                    # Drain anything left behind by processes that exited without reporting
+                    try:
+                        message = result_queue.get(timeout=1)
+                    except queue.Empty:
+                        break
+                else:
+                    continue
+
+            if message[0] == "done":
+                request_count += message[1]
+                remaining -= 1
+            else:
+                yield message[1], message[2], message[3]
+    finally:
+        # Stop queued work if the consumer is interrupted, fails or closes the generator
+        stop_event.set()
+        if remaining > 0:
+            # Nothing drains the result queue any more, so abandon in-flight work in child processes
+            for child in children:
+                child.terminate()
+        for child in children:
+            child.join()
+
+    return request_count
+
+
+def open_output(path):
+    """
+    Open an output path for writing text, with "-" meaning stdout.
+    :param path:
+    :return:
+    """
+    if path in (None, "-"):
+        return sys.stdout
+    return open(path, "w", encoding="utf-8")
+
+
+def read_case_numbers(values, input_path=None):
+    """
+    Collect unique case numbers from arguments and an input file of case numbers or
+    JSON lines with a `case_number` field, preserving order.  Raises ValueError on
+    malformed JSON lines.
+    :param values:
+    :param input_path:
+    :return:
+    """
+    lines = list(values or [])
+    if input_path:
+        input_file = sys.stdin if input_path == "-" else open(input_path, encoding="utf-8")
+        try:
+            lines.extend(input_file.read().splitlines())
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+
+    case_numbers = []
+    seen = set()
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                raise ValueError("invalid JSON on input line {0}: {1}".format(line_number, line))
+            line = record.get("case_number")
+            if not line:
+                continue
+        if line not in seen:
+            seen.add(line)
+            case_numbers.append(line)
+
+    return case_numbers
+
+
+def get_case_path(directory, case_number):
+    """
+    Get the path of a synced case file.
+    :param directory:
+    :param case_number:
+    :return:
+    """
+    return os.path.join(directory, "{0}.json".format(case_number))
+
+
+def consume(results, progress, handle_result, handle_error=None):
+    """
+    Drain a run_sharded generator into result and error handlers, updating progress.
+    :param results:
+    :param progress:
+    :param handle_result:
+    :param handle_error:
+    :return:
+    """
+    while True:
+        try:
+            item, result, error = next(results)
+        except StopIteration as e:
+            progress.requests += e.value or 0
+            break
+
+        if error:
+            if handle_error:
+                handle_error(item, error)
+            progress.update(error=error)
+        else:
+            progress.update(records=handle_result(item, result) or 0)
+
+    progress.report()
+
+
+def report_error(item, error):
+    """
+    Write a task error to stderr.
+    :param item:
+    :param error:
+    :return:
+    """
+    sys.stderr.write("error: {0}: {1}\n".format(to_json(item), error))
+
+
+def run_list(args, handle_case):
+    """
+    Run a sharded case search, passing each unique case to a handler as shards complete, and
+    return the progress tracker.  Cases returned by more than one shard, e.g. for overlapping
+    company filters, are only handled and counted once.
+    :param args:
+    :param handle_case:
+    :return:
+    """
+    shards = get_search_shards(args.start, args.end, args.status, args.case_type, args.company, args.shard_days)
+    progress = Progress("list", len(shards), quiet=args.quiet)
+    results = run_sharded(list_shard, shards, args.processes, args.workers, args.rate, progress)
+
+    seen = set()
+
+    def handle_result(_, shard_cases):
+        records = 0
+        for case in shard_cases:
+            case_key = case.get("case_number") or case.get("url")
+            if case_key in seen:
+                continue
+            seen.add(case_key)
+            handle_case(case)
+            records += 1
+        return records
+
+    consume(results, progress, handle_result, report_error)
+    return progress
+
+
+def command_list(args):
+    """
+    List cases matching a search, writing JSON lines.
+    :param args:
+    :return:
+    """
+    output = open_output(args.output)
+
+    def handle_case(case):
+        output.write(to_json(case) + "\n")
+
+    try:
+        progress = run_list(args, handle_case)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return {"list": progress.stats()}
+
+
+def command_fetch(args):
+    """
+    Fetch case details, writing JSON lines.
+    :param args:
+    :return:
+    """
+    progress = Progress("fetch", len(args.case_numbers), quiet=args.quiet)
+    results = run_sharded(fetch_case, args.case_numbers, args.processes, args.workers, args.rate, progress)
+
+    output = open_output(args.output)
+
+    def handle_result(_, case_info):
+        output.write(to_json(case_info) + "\n")
+        return 1
+
+    try:
+        consume(results, progress, handle_result, report_error)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return {"fetch": progress.stats()}
+
+
+def command_sync(args):
+    """
+    List cases matching a search and fetch any not already present in the sync directory.
+    :param args:
+    :return:
+    """
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+
+    case_numbers = []
+
+    def handle_case(case):
+        if case.get("case_number"):
+            case_numbers.append(case["case_number"])
+
+    list_progress = run_list(args, handle_case)
+
+    # Skip cases already synced unless refreshing
+    skipped = 0
+    if not args.refresh:
+        pending = [case_number for case_number in case_numbers
+                   if not os.path.exists(get_case_path(args.directory, case_number))]
+        skipped = len(case_numbers) - len(pending)
+        case_numbers = pending
+
+    fetch_progress = Progress("fetch", len(case_numbers), quiet=args.quiet)
+    results = run_sharded(fetch_case, case_numbers, args.processes, args.workers, args.rate, fetch_progress)
+
+    def handle_result(case_number, case_info):
+        # Write to a temporary file first so an interrupted sync never leaves partial case files
+        case_path = get_case_path(args.directory, case_number)
+        with open(case_path + ".tmp", "w", encoding="utf-8") as case_file:
+            case_file.write(to_json(case_info))
+        os.replace(case_path + ".tmp", case_path)
+        return 1
+
+    consume(results, fetch_progress, handle_result, report_error)
+
+    fetch_stats = fetch_progress.stats()
+    fetch_stats["skipped"] = skipped
+    return {"list": list_progress.stats(), "fetch": fetch_stats}
+
+
+def get_export_table(case_records, table):
+    """
+    Build an export dataframe from serialized case records.
+    :param case_records:
+    :param table:
+    :return:
+    """
+    rows = []
+    for case_info in case_records:
+        if table == "cases":
+            rows.append({key: value for key, value in case_info.items() if not isinstance(value, list)})
+        elif table == "allegations":
+            rows.extend({"case_number": case_info.get("case_number"), "allegation": allegation}
+                        for allegation in case_info.get(table) or [])
+        else:
+            for row in case_info.get(table) or []:
+                row = dict(row)
+                row["case_number"] = case_info.get("case_number")
+                rows.append(row)
+
+    df = pandas.DataFrame(rows)
+    if "case_number" in df.columns:
+        df = df[["case_number"] + [column for column in df.columns if column != "case_number"]]
+
+    return df
+
+
+def command_export(args):
+    """
+    Export a sync directory as a CSV table.
+    :param args:
+    :return:
+    """
+    file_names = sorted(file_name for file_name in os.listdir(args.directory) if file_name.endswith(".json"))
+    progress = Progress("export", len(file_names), quiet=args.quiet)
+
+    case_records = []
+    for file_name in file_names:
+        try:
+            with open(os.path.join(args.directory, file_name), encoding="utf-8") as case_file:
+                case_records.append(json.load(case_file))
+        except ValueError as e:
+            report_error(file_name, e)
+            progress.update(error=e)
+        else:
+            progress.update()
+
+    df = get_export_table(case_records, args.table)
+    progress.records = df.shape[0]
+
+    output = open_output(args.output)
+    try:
+        df.to_csv(output, index=False)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    progress.report()
+    return {"export": progress.stats()}
+
+
+def add_run_arguments(parser):
+    """
+    Add parallelism and reporting arguments.
+    :param parser:
+    :return:
+    """
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES,
+                        help="number of local processes to shard work across (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of worker threads per process (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="maximum total requests per second across all processes; 0 disables "
+                             "limiting (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress to stderr")
+
+
+def add_search_arguments(parser):
+    """
+    Add search filter arguments.
+    :param parser:
+    :return:
+    """
+    parser.add_argument("--start", type=parse_date, required=True, help="first date of the search range")
+    parser.add_argument("--end", type=parse_date, default=datetime.date.today(),
+                        help="last date of the search range (default: today)")
+    parser.add_argument("--status", action="append", help="case status filter; may be repeated")
+    parser.add_argument("--case-type", action="append", help="case type filter; may be repeated")
+    parser.add_argument("--company", action="append", help="company name filter; may be repeated")
+    parser.add_argument("--shard-days", type=int, default=DEFAULT_SHARD_DAYS,
+                        help="number of days per search shard (default: %(default)s)")
+
+
+def get_parser():
+    """
+    Build the argument parser.
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog="nlrb-data", description="Retrieve data from the NLRB public website.")
+    parser.add_argument("--version", action="version", version="%(prog)s {0}".format(__version__))
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    list_parser = subparsers.add_parser("list", help="list cases matching a search as JSON lines")
+    add_search_arguments(list_parser)
+    add_run_arguments(list_parser)
+    list_parser.add_argument("--output", default="-", help="output path (default: stdout)")
+    list_parser.set_defaults(func=command_list)
+
+    fetch_parser = subparsers.add_parser("fetch", help="fetch case details as JSON lines")
+    fetch_parser.add_argument("case_numbers", nargs="*", help="case numbers to fetch")
+    fetch_parser.add_argument("--input", help="file of case numbers or `list` output; - for stdin")
+    add_run_arguments(fetch_parser)
+    fetch_parser.add_argument("--output", default="-", help="output path (default: stdout)")
+    fetch_parser.set_defaults(func=command_fetch)
+
+    sync_parser = subparsers.add_parser("sync", help="fetch cases matching a search into a directory")
+    add_search_arguments(sync_parser)
+    add_run_arguments(sync_parser)
+    sync_parser.add_argument("--directory", required=True, help="directory of case JSON files")
+    sync_parser.add_argument("--refresh", action="store_true", help="re-fetch cases already in the directory")
+    sync_parser.set_defaults(func=command_sync)
+
+    export_parser = subparsers.add_parser("export", help="export a sync directory as CSV")
+    export_parser.add_argument("--directory", required=True, help="directory of case JSON files")
+    export_parser.add_argument("--table", choices=CASE_TABLES, default="cases",
+                               help="table to export (default: %(default)s)")
+    export_parser.add_argument("--output", default="-", help="output path (default: stdout)")
+    export_parser.add_argument("--quiet", action="store_true", help="do not print progress to stderr")
+    export_parser.set_defaults(func=command_export)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Console script entry point.  Prints summary statistics as a JSON line on stderr and
+    returns a non-zero exit status if any task failed.
+    :param argv:
+    :return:
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if getattr(args, "processes", 1) < 1 or getattr(args, "workers", 1) < 1:
+        parser.error("--processes and --workers must be positive")
+    if getattr(args, "shard_days", 1) < 1:
+        parser.error("--shard-days must be positive")
+    if getattr(args, "rate", 0) < 0:
+        parser.error("--rate must not be negative")
+    if getattr(args, "start", None) and args.start > args.end:
+        parser.error("--start must not be after --end")
+    if args.command == "fetch":
+        try:
+            args.case_numbers = read_case_numbers(args.case_numbers, args.input)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not args.case_numbers:
+            parser.error("no case numbers given")
+    if args.command == "export" and not os.path.isdir(args.directory):
+        parser.error("directory not found: {0}".format(args.directory))
+
+    stats = {"command": args.command}
+    stats.update(args.func(args))
+    sys.stderr.write(to_json({"stats": stats}) + "\n")
+    sys.stderr.flush()
+
+    failed = sum(value["failed"] + value["incomplete"] for value in stats.values() if isinstance(value, dict))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
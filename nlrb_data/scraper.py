@@ -70,22 +70,34 @@ def get_case_list_url(dates=None, status=None, case_type=None, company=None, pag
     return url
 
 
-def get_page_count(url, session=None):
+def get_page_count(url, session=None, sleep_interval=None):
     """
     Get the page count from a given URL.
     :param url:
     :param session:
+    :param sleep_interval: seconds to sleep after the request; defaults to SLEEP_INTERVAL
     :return:
     """
     # Create session if not provided
     if not session:
         session = requests.Session()
 
+    if sleep_interval is None:
+        sleep_interval = SLEEP_INTERVAL
+
     # Execute query
     response = session.get(url, timeout=TIMEOUT)
-    buffer = response.text
-    time.sleep(SLEEP_INTERVAL)
+    time.sleep(sleep_interval)
+
+    return parse_page_count(response.text)
 
+
+def parse_page_count(buffer):
+    """
+    Parse the page count from a case list document.
+    :param buffer:
+    :return:
+    """
     # Find last "?page=" occurrence.
     pos0 = pos1 = buffer.rfind("?page=")
     if pos0 == -1:
@@ -162,7 +174,7 @@ def parse_case_list(buffer):
     return cases
 
 
-def get_case_list(dates=None, status=None, case_type=None, company=None, session=None):
+def get_case_list(dates=None, status=None, case_type=None, company=None, session=None, sleep_interval=None):
     """
     Get the list of cases matching a given set of search parameters.
     :param case_type:
@@ -170,21 +182,28 @@ def get_case_list(dates=None, status=None, case_type=None, company=None, session
     :param status:
     :param company:
     :param session:
+    :param sleep_interval: seconds to sleep after each request; defaults to SLEEP_INTERVAL
     :return:
     """
     # Create session if not provided
     if not session:
         session = requests.Session()
 
+    if sleep_interval is None:
+        sleep_interval = SLEEP_INTERVAL
+
     # Setup return structure
     cases = []
 
-    # Initial URL
+    # Initial URL; the first page gives both the page count and the first page of cases
     initial_url = get_case_list_url(dates, status, case_type, company, page_number=0)
-    max_page_count = get_page_count(initial_url)
+    response = session.get(initial_url, timeout=TIMEOUT)
+    max_page_count = parse_page_count(response.text)
+    cases.extend(parse_case_list(response.text))
+    time.sleep(sleep_interval)
 
-    # Iterate through all page requests
-    for page_number in range(0, max_page_count):
+    # Iterate through remaining page requests
+    for page_number in range(1, max_page_count):
         # Get URL and response
 
         page_url = get_case_list_url(dates, status, case_type, company, page_number=page_number)
@@ -192,7 +211,7 @@ def get_case_list(dates=None, status=None, case_type=None, company=None, session
 
         # Parse result and sleep
         cases.extend(parse_case_list(response.text))
-        time.sleep(SLEEP_INTERVAL)
+        time.sleep(sleep_interval)
 
     # Return list of cases
     return cases
@@ -0,0 +1,378 @@
+"""CLI unit test coverage
+"""
+
+# Project imports
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import pandas
+from nose.tools import assert_equal, assert_raises
+
+from nlrb_data.cli import RateLimiter, Progress, get_date_shards, get_search_shards, serialize_case, to_json, \
+    read_case_numbers, run_sharded, get_export_table, get_parser, main
+
+# Fake search results by company; "Acme" and "Acme Corp" overlap on 01-CA-000002
+FAKE_CASE_LISTS = {"Acme": [{"case_number": "01-CA-000001", "title": "Acme"},
+                            {"case_number": "01-CA-000002", "title": "Acme Corp"}],
+                   "Acme Corp": [{"case_number": "01-CA-000002", "title": "Acme Corp"},
+                                 {"case_number": "01-CA-000003", "title": "Acme Corp East"}]}
+FAILING_CASES = set()
+CRASHING_CASES = set()
+STARTED_ITEMS = []
+
+
+def double_item(item, session):
+    """
+    Test task that doubles its item and fails on negative items.
+    :param item:
+    :param session:
+    :return:
+    """
+    if item < 0:
+        raise ValueError("negative item")
+    return item * 2
+
+
+def record_item(item, session):
+    """
+    Test task that records its item in STARTED_ITEMS.
+    :param item:
+    :param session:
+    :return:
+    """
+    STARTED_ITEMS.append(item)
+    time.sleep(0.05)
+    return item
+
+
+def slow_item(item, session):
+    """
+    Test task that takes longer than the result queue poll.
+    :param item:
+    :param session:
+    :return:
+    """
+    time.sleep(1.5)
+    return item
+
+
+def fake_get_case_list(dates=None, status=None, case_type=None, company=None, session=None, sleep_interval=None):
+    """
+    Fake scraper search that requires the CLI to disable the fixed sleep.
+    :return:
+    """
+    assert_equal(sleep_interval, 0)
+    return [dict(case) for case in FAKE_CASE_LISTS.get(company, [])]
+
+
+def fake_get_case(case_id, session=None):
+    """
+    Fake scraper case detail that fails for case numbers in FAILING_CASES and exits the worker
+    process for case numbers in CRASHING_CASES.
+    :return:
+    """
+    if case_id in FAILING_CASES:
+        raise ValueError("missing case")
+    if case_id in CRASHING_CASES:
+        os._exit(1)
+    return {"case_number": case_id, "city": "MEDFIELD, MA", "allegations": [],
+            "docket": pandas.DataFrame([{"Date": "06/13/2013"}])}
+
+
+def run_main(argv):
+    """
+    Run the CLI with fake scraper methods, returning the exit status, stats and stderr.
+    :param argv:
+    :return:
+    """
+    stderr = io.StringIO()
+    with mock.patch("nlrb_data.scraper.get_case_list", fake_get_case_list), \
+            mock.patch("nlrb_data.scraper.get_case", fake_get_case), \
+            mock.patch("sys.stderr", stderr):
+        status = main(argv + ["--quiet", "--rate", "0"])
+
+    stats = json.loads(stderr.getvalue().splitlines()[-1])["stats"]
+    return status, stats, stderr.getvalue()
+
+
+def test_rate_limiter():
+    """
+    Test rate limiter spacing.
+    :return:
+    """
+    limiter = RateLimiter(20)
+    start_time = time.monotonic()
+    for _ in range(5):
+        limiter.wait()
+    assert 0.2 <= time.monotonic() - start_time < 1.0
+
+    # Check disabled limiter does not wait
+    limiter = RateLimiter(0)
+    start_time = time.monotonic()
+    for _ in range(100):
+        limiter.wait()
+    assert time.monotonic() - start_time < 0.1
+
+
+def test_get_date_shards():
+    """
+    Test splitting a date range into windows.
+    :return:
+    """
+    shards = get_date_shards(datetime.date(2010, 1, 1), datetime.date(2010, 1, 20), 7)
+    assert_equal(shards, [(datetime.date(2010, 1, 1), datetime.date(2010, 1, 7)),
+                          (datetime.date(2010, 1, 8), datetime.date(2010, 1, 14)),
+                          (datetime.date(2010, 1, 15), datetime.date(2010, 1, 20))])
+
+    # Check single-day range
+    assert_equal(get_date_shards(datetime.date(2010, 1, 1), datetime.date(2010, 1, 1), 7),
+                 [(datetime.date(2010, 1, 1), datetime.date(2010, 1, 1))])
+
+    assert_raises(ValueError, get_date_shards, datetime.date(2010, 1, 1), datetime.date(2010, 1, 1), 0)
+
+
+def test_get_search_shards():
+    """
+    Test search shards cover all filter combinations.
+    :return:
+    """
+    shards = get_search_shards(datetime.date(2010, 1, 1), datetime.date(2010, 1, 14), case_types=["CA", "RC"],
+                               companies=["Acme"], shard_days=7)
+    assert_equal(len(shards), 4)
+    assert_equal(shards[0], {"dates": (datetime.date(2010, 1, 1), datetime.date(2010, 1, 7)),
+                             "status": None, "case_type": "CA", "company": "Acme"})
+
+
+def test_serialize_case():
+    """
+    Test case serialization to JSON.
+    :return:
+    """
+    case_info = {"case_number": "01-CA-104714",
+                 "docket": pandas.DataFrame([{"Date": "06/13/2013", "Issued/Filed By": None}]),
+                 "elections": pandas.DataFrame(),
+                 "allegations": ["8(a)(1) Weingarten"]}
+    result = json.loads(to_json(serialize_case(case_info)))
+    assert_equal(result["docket"], [{"Date": "06/13/2013", "Issued/Filed By": None}])
+    assert_equal(result["elections"], [])
+    assert_equal(to_json({"status_date": datetime.date(2013, 6, 11)}), '{"status_date": "2013-06-11"}')
+
+
+def test_read_case_numbers():
+    """
+    Test reading case numbers from arguments and list output.
+    :return:
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(temp_dir, "cases.jsonl")
+        with open(input_path, "w") as input_file:
+            input_file.write('{"case_number": "02-RC-023360"}\n\n01-CA-104714\n')
+
+        assert_equal(read_case_numbers(["01-CA-104714"], input_path), ["01-CA-104714", "02-RC-023360"])
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_run_sharded():
+    """
+    Test sharded execution in threads and processes.
+    :return:
+    """
+    for processes in (1, 2):
+        results = sorted(run_sharded(double_item, [1, 2, 3, -1], processes=processes, workers=2, rate=0))
+        assert_equal(results, [(-1, None, "ValueError: negative item"), (1, 2, None), (2, 4, None), (3, 6, None)])
+
+
+def test_run_sharded_close():
+    """
+    Test closing the result generator stops queued items.
+    :return:
+    """
+    del STARTED_ITEMS[:]
+    results = run_sharded(record_item, list(range(20)), processes=1, workers=1, rate=0)
+    assert_equal(next(results)[1], 0)
+    results.close()
+
+    # Check at most the item in flight at close ran
+    time.sleep(0.5)
+    assert len(STARTED_ITEMS) <= 2
+
+
+def test_run_sharded_progress():
+    """
+    Test progress is reported while a slow task is running.
+    :return:
+    """
+    stream = io.StringIO()
+    progress = Progress("slow", 1, interval=0.5, stream=stream)
+    results = run_sharded(slow_item, [1], rate=0, progress=progress)
+    assert_equal(next(results), (1, 1, None))
+
+    # Check a report was written before the task completed
+    assert_equal(stream.getvalue().splitlines()[0].split(",")[0], "slow: 0/1 done")
+    results.close()
+
+
+def test_get_export_table():
+    """
+    Test building export tables.
+    :return:
+    """
+    case_records = [{"case_number": "01-CA-104714", "city": "MEDFIELD, MA", "allegations": ["8(a)(1) Weingarten"],
+                     "docket": [{"Date": "06/13/2013"}, {"Date": "05/13/2013"}]}]
+    assert_equal(list(get_export_table(case_records, "cases").columns), ["case_number", "city"])
+    assert_equal(get_export_table(case_records, "docket").shape, (2, 2))
+    assert_equal(get_export_table(case_records, "allegations")["allegation"].tolist(), ["8(a)(1) Weingarten"])
+
+
+def test_export():
+    """
+    Test exporting a sync directory.
+    :return:
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(temp_dir, "01-CA-104714.json"), "w") as case_file:
+            case_file.write(to_json({"case_number": "01-CA-104714", "participants": [{"party_name": "ACE"}]}))
+
+        output_path = os.path.join(temp_dir, "participants.csv")
+        assert_equal(main(["export", "--directory", temp_dir, "--table", "participants", "--output", output_path,
+                           "--quiet"]), 0)
+        assert_equal(pandas.read_csv(output_path).to_dict(orient="records"),
+                     [{"case_number": "01-CA-104714", "party_name": "ACE"}])
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_parser():
+    """
+    Test argument parsing.
+    :return:
+    """
+    args = get_parser().parse_args(["list", "--start", "2010-01-01", "--end", "2010-02-01", "--case-type", "CA",
+                                    "--case-type", "RC", "--processes", "4", "--workers", "2", "--rate", "2"])
+    assert_equal(args.start, datetime.date(2010, 1, 1))
+    assert_equal(args.case_type, ["CA", "RC"])
+    assert_equal((args.processes, args.workers, args.rate), (4, 2, 2.0))
+
+    assert_raises(SystemExit, main, ["fetch"])
+    assert_raises(SystemExit, main, ["list", "--start", "2010-02-01", "--end", "2010-01-01"])
+    assert_raises(SystemExit, main, ["export", "--directory", os.path.join(tempfile.gettempdir(), "nlrb-missing")])
+
+
+def test_list():
+    """
+    Test list output is deduplicated across overlapping shards.
+    :return:
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        output_path = os.path.join(temp_dir, "cases.jsonl")
+        status, stats, _ = run_main(["list", "--start", "2010-01-01", "--end", "2010-01-01", "--company", "Acme",
+                                     "--company", "Acme Corp", "--output", output_path])
+        assert_equal(status, 0)
+        assert_equal(stats["command"], "list")
+        assert_equal((stats["list"]["total"], stats["list"]["succeeded"], stats["list"]["records"]), (2, 2, 3))
+
+        with open(output_path) as output_file:
+            case_numbers = sorted(json.loads(line)["case_number"] for line in output_file)
+        assert_equal(case_numbers, ["01-CA-000001", "01-CA-000002", "01-CA-000003"])
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_fetch():
+    """
+    Test fetch output, stats and exit status.
+    :return:
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        input_path = os.path.join(temp_dir, "cases.jsonl")
+        with open(input_path, "w") as input_file:
+            input_file.write('{"case_number": "01-CA-000001"}\n01-CA-000002\n')
+
+        output_path = os.path.join(temp_dir, "case_details.jsonl")
+        status, stats, _ = run_main(["fetch", "--input", input_path, "--output", output_path])
+        assert_equal(status, 0)
+        assert_equal((stats["fetch"]["succeeded"], stats["fetch"]["failed"], stats["fetch"]["incomplete"]), (2, 0, 0))
+
+        with open(output_path) as output_file:
+            case_infos = sorted((json.loads(line) for line in output_file), key=lambda case: case["case_number"])
+        assert_equal(case_infos[0]["docket"], [{"Date": "06/13/2013"}])
+
+        # Check failures are reported and give a non-zero exit status
+        FAILING_CASES.add("01-CA-000002")
+        try:
+            status, stats, stderr = run_main(["fetch", "01-CA-000001", "01-CA-000002", "--output", output_path])
+        finally:
+            FAILING_CASES.clear()
+        assert_equal(status, 1)
+        assert_equal((stats["fetch"]["succeeded"], stats["fetch"]["failed"]), (1, 1))
+        assert "ValueError: missing case" in stderr
+
+        # Check tasks lost with a crashed worker process give a non-zero exit status; the fake scraper
+        # methods are only inherited by forked processes
+        if multiprocessing.get_start_method() == "fork":
+            CRASHING_CASES.add("01-CA-000002")
+            try:
+                status, stats, _ = run_main(["fetch", "01-CA-000001", "01-CA-000002", "--processes", "2",
+                                             "--output", output_path])
+            finally:
+                CRASHING_CASES.clear()
+            assert_equal(status, 1)
+            assert_equal((stats["fetch"]["succeeded"], stats["fetch"]["incomplete"]), (1, 1))
+
+        # Check malformed input is a usage error
+        with open(input_path, "w") as input_file:
+            input_file.write("{bad\n")
+        assert_raises(SystemExit, run_main, ["fetch", "--input", input_path])
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_sync():
+    """
+    Test sync writes case files, skips synced cases and refreshes on request.
+    :return:
+    """
+    temp_dir = tempfile.mkdtemp()
+    sync_args = ["sync", "--start", "2010-01-01", "--end", "2010-01-01", "--company", "Acme", "--company",
+                 "Acme Corp", "--directory", temp_dir]
+    try:
+        # Check first sync with one failing case
+        FAILING_CASES.add("01-CA-000003")
+        try:
+            status, stats, _ = run_main(sync_args)
+        finally:
+            FAILING_CASES.clear()
+        assert_equal(status, 1)
+        assert_equal(stats["list"]["records"], 3)
+        assert_equal((stats["fetch"]["total"], stats["fetch"]["succeeded"], stats["fetch"]["failed"],
+                      stats["fetch"]["skipped"]), (3, 2, 1, 0))
+        assert_equal(sorted(os.listdir(temp_dir)), ["01-CA-000001.json", "01-CA-000002.json"])
+
+        with open(os.path.join(temp_dir, "01-CA-000001.json")) as case_file:
+            assert_equal(json.load(case_file)["city"], "MEDFIELD, MA")
+
+        # Check second sync only fetches the missing case
+        status, stats, _ = run_main(sync_args)
+        assert_equal(status, 0)
+        assert_equal((stats["fetch"]["total"], stats["fetch"]["succeeded"], stats["fetch"]["skipped"]), (1, 1, 2))
+        assert_equal(sorted(os.listdir(temp_dir)), ["01-CA-000001.json", "01-CA-000002.json", "01-CA-000003.json"])
+
+        # Check refresh fetches everything
+        status, stats, _ = run_main(sync_args + ["--refresh"])
+        assert_equal(status, 0)
+        assert_equal((stats["fetch"]["total"], stats["fetch"]["skipped"]), (3, 0))
+        assert_equal(len(os.listdir(temp_dir)), 3)
+    finally:
+        shutil.rmtree(temp_dir)
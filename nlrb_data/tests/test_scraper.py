@@ -9,6 +9,28 @@ from nose.tools import assert_equal
 
 from nlrb_data.scraper import get_case_list_url, get_page_count, get_case_list, get_case, SLEEP_INTERVAL
 
+# Minimal case list page with a link to a last page number of 2
+FAKE_CASE_LIST_PAGE = """<ul><li class="search-result"><h3 class="title"><a href="/case/{0}">Acme</a></h3>
+<div><span class="label">Case Number:</span> {0}</div></li></ul><a href="/search/cases/Acme?page=2">last</a>"""
+
+
+class FakeResponse(object):
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeSession(object):
+    """
+    Session stand-in that records requested URLs and returns one case per page.
+    """
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return FakeResponse(FAKE_CASE_LIST_PAGE.format("01-CA-{0:06d}".format(len(self.urls))))
+
 
 def test_case_list_url():
     """
@@ -61,6 +83,18 @@ def test_get_case_list():
     assert_equal(case_list[0]["title"], "ACME Markets")
 
 
+def test_get_case_list_pages():
+    """
+    Test each case list page is requested once.
+    :return:
+    """
+    session = FakeSession()
+    case_list = get_case_list(company="Acme", session=session, sleep_interval=0)
+    assert_equal(session.urls, ["https://www.nlrb.gov/search/cases/Acme?",
+                                "https://www.nlrb.gov/search/cases/Acme?&page=1"])
+    assert_equal([case["case_number"] for case in case_list], ["01-CA-000001", "01-CA-000002"])
+
+
 def test_get_case():
     """
     Test case detail on real queries.